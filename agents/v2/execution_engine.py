@@ -70,8 +70,7 @@ class ExecutionEngine:
         }
         
         with state.lock:
-            state.trades.append(new_trade)
-            if len(state.trades) > 50: state.trades.pop(0)
+            state.trades.append(new_trade) # deque(maxlen) evicts the oldest trade
 
         # Emit audit event
         self.manager.emit_event(AgentEvent(
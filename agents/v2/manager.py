@@ -3,6 +3,8 @@ import json
 import datetime
 import threading
 import time
+from collections import deque
+from itertools import islice
 
 class AgentEvent:
     def __init__(self, symbol, agent_name, state, reason, context, confidence, payload=None):
@@ -31,7 +33,7 @@ class AgentManager:
     def __init__(self, state):
         self.state = state
         self.agents = {}
-        self.event_history = []
+        self.event_history = deque(maxlen=500)
         self.lock = threading.Lock()
 
     def register_agent(self, name, agent_instance):
@@ -44,15 +46,14 @@ class AgentManager:
             # but keep the structure as requested.
             event_dict = event.to_dict()
             self.event_history.append(event_dict)
-            if len(self.event_history) > 500:
-                self.event_history.pop(0)
         
         # Sequentially trigger reactors if any (though we use a pipeline in server.py)
         pass
 
     def get_audit_trail(self, limit=50):
         with self.lock:
-            return self.event_history[-limit:]
+            # Walk back from the newest end: O(limit) instead of copying the whole history
+            return list(islice(reversed(self.event_history), limit))[::-1]
 
     def get_agent_statuses(self):
         statuses = {}
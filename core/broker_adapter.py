@@ -1,6 +1,10 @@
 
 import asyncio
 import datetime
+import os
+import socket
+import sys
+import time
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
@@ -18,7 +22,9 @@ except Exception as e:
     print(f"[CORE] pya3 patch skipped: {e}")
 # --- PYA3 PATCH END ---
 
-from pya3 import Aliceblue, LiveFeedType
+from pya3 import Aliceblue
+
+from .broker_rest import resolve_instrument, build_scrip_quote, totp_now, attach_shared_session
 
 class BrokerDataAdapter(ABC):
     @abstractmethod
@@ -37,7 +43,42 @@ class BrokerDataAdapter(ABC):
     async def unsubscribe(self, symbols: List[Dict[str, Any]]):
         pass
 
+# Authenticated broker sessions reused across adapter instances (mode flips re-create the adapter)
+SESSION_TTL = 6 * 60 * 60  # seconds; conservative vs. the broker's trading-day session
+SESSION_REFRESH_MARGIN = 30
+
+# Linux values; not exported by every Python build
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+SO_PREFER_BUSY_POLL = getattr(socket, "SO_PREFER_BUSY_POLL", 69)  # kernel 5.11+
+
+def tune_feed_socket(alice) -> None:
+    """
+    Opt-in low-latency tuning for the tick WebSocket: FEED_BUSY_POLL_US=<µs> enables
+    SO_BUSY_POLL (Linux, needs CAP_NET_ADMIN). websocket-client already sets TCP_NODELAY.
+    """
+    try:
+        busy_poll_us = int(os.getenv("FEED_BUSY_POLL_US", "0") or 0)
+    except ValueError:
+        busy_poll_us = 0  # Runs inside pya3's on_open callback: never raise on a bad value
+    if busy_poll_us <= 0 or sys.platform != "linux":
+        return
+    try:
+        sock = alice.ws.sock.sock
+        sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, busy_poll_us)
+        print(f"[ADAPTER] Feed socket busy-poll enabled ({busy_poll_us}µs)")
+    except (AttributeError, OSError) as e:
+        print(f"[ADAPTER] Feed socket tuning skipped: {e}")
+        return
+    try:
+        # Keep NAPI polling in the receive path instead of deferring to softirq (older kernels lack it)
+        sock.setsockopt(socket.SOL_SOCKET, SO_PREFER_BUSY_POLL, 1)
+    except OSError as e:
+        print(f"[ADAPTER] SO_PREFER_BUSY_POLL unavailable: {e}")
+
 class AliceBlueAdapter(BrokerDataAdapter):
+    # user_id -> (session_id, expires_at); each adapter builds its own Aliceblue so no websocket is shared
+    _sessions: Dict[str, Any] = {}
+
     def __init__(self, user_id, api_key, totp_secret, callback):
         self.user_id = user_id
         self.api_key = api_key
@@ -47,50 +88,30 @@ class AliceBlueAdapter(BrokerDataAdapter):
         self.is_connected = False
 
     async def connect(self) -> bool:
-        import pyotp
         try:
-            print(f"[ADAPTER] Authenticating user {self.user_id}...")
-            self.alice = Aliceblue(user_id=self.user_id, api_key=self.api_key)
-            session_res = self.alice.get_session_id(pyotp.TOTP(self.totp_secret).now())
-            
-            if not session_res or not isinstance(session_res, dict) or not session_res.get("sessionID"):
-                print(f"[ADAPTER] Login failed: {session_res}")
-                return False
-            
-            # Set session ID explicitly if library doesn't
-            if getattr(self.alice, 'session_id', None) is None:
-                self.alice.session_id = session_res.get('sessionID')
-            
-            print("[ADAPTER] Authentication successful. Starting WebSocket...")
-            
-            # Wrap standard pya3 callbacks to bridge to our async Manager if needed
-            # Support multiple pya3 versions (some use socket_open_callback, others use on_open)
+            # Login and the websocket handshake block on HTTP: keep them off the event loop
+            handshake = asyncio.ensure_future(asyncio.to_thread(self._open_feed))
             try:
-                self.alice.start_websocket(
-                    socket_open_callback=self._on_open,
-                    socket_close_callback=self._on_close,
-                    socket_error_callback=self._on_error,
-                    subscription_callback=self.callback,
-                    run_in_background=True
-                )
-            except TypeError:
+                opened = await asyncio.shield(handshake)
+            except asyncio.CancelledError:
+                # The worker thread can't be interrupted: let it finish, then close whatever it opened
                 try:
-                    self.alice.start_websocket(
-                        on_open=self._on_open,
-                        on_close=self._on_close,
-                        on_error=self._on_error,
-                        on_data=self.callback,
-                        run_in_background=True
-                    )
-                except Exception as e:
-                    print(f"[ADAPTER] Failed to start WebSocket: {e}")
-                    return False
-            
+                    await handshake
+                except Exception:
+                    pass
+                await self.disconnect()
+                raise
+            if not opened:
+                return False
+
             # Wait for connection
             for _ in range(10):
                 if self.is_connected: break
                 await asyncio.sleep(0.5)
             
+            if not self.is_connected:
+                # Session may have been revoked server-side: force a fresh login next time
+                self._sessions.pop(self.user_id, None)
             return self.is_connected
         except Exception as e:
             print(f"[ADAPTER] Connection error: {e}")
@@ -98,9 +119,66 @@ class AliceBlueAdapter(BrokerDataAdapter):
             traceback.print_exc()
             return False
 
+    def _open_feed(self) -> bool:
+        """Blocking part of connect: authenticate and start pya3's background websocket"""
+        if not self._authenticate():
+            return False
+
+        print("[ADAPTER] Starting WebSocket...")
+        
+        # Wrap standard pya3 callbacks to bridge to our async Manager if needed
+        # Support multiple pya3 versions (some use socket_open_callback, others use on_open)
+        try:
+            self.alice.start_websocket(
+                socket_open_callback=self._on_open,
+                socket_close_callback=self._on_close,
+                socket_error_callback=self._on_error,
+                subscription_callback=self.callback,
+                run_in_background=True
+            )
+        except TypeError:
+            try:
+                self.alice.start_websocket(
+                    on_open=self._on_open,
+                    on_close=self._on_close,
+                    on_error=self._on_error,
+                    on_data=self.callback,
+                    run_in_background=True
+                )
+            except Exception as e:
+                print(f"[ADAPTER] Failed to start WebSocket: {e}")
+                return False
+        return True
+
+    def _authenticate(self) -> bool:
+        """Log in via TOTP, reusing a cached session for this user while it is still valid"""
+        cached = self._sessions.get(self.user_id)
+        if cached and time.time() < cached[1] - SESSION_REFRESH_MARGIN:
+            self.alice = attach_shared_session(
+                Aliceblue(user_id=self.user_id, api_key=self.api_key, session_id=cached[0]))
+            print(f"[ADAPTER] Reusing broker session for {self.user_id}.")
+            return True
+
+        print(f"[ADAPTER] Authenticating user {self.user_id}...")
+        self.alice = attach_shared_session(Aliceblue(user_id=self.user_id, api_key=self.api_key))
+        session_res = self.alice.get_session_id(totp_now(self.totp_secret))
+        
+        if not session_res or not isinstance(session_res, dict) or not session_res.get("sessionID"):
+            print(f"[ADAPTER] Login failed: {session_res}")
+            return False
+        
+        # Set session ID explicitly if library doesn't
+        if getattr(self.alice, 'session_id', None) is None:
+            self.alice.session_id = session_res.get('sessionID')
+        
+        self._sessions[self.user_id] = (self.alice.session_id, time.time() + SESSION_TTL)
+        print("[ADAPTER] Authentication successful.")
+        return True
+
     def _on_open(self):
         self.is_connected = True
         print("[ADAPTER] WebSocket Connected")
+        tune_feed_socket(self.alice)
 
     def _on_close(self):
         self.is_connected = False
@@ -124,35 +202,31 @@ class AliceBlueAdapter(BrokerDataAdapter):
         if not self.alice or not self.is_connected:
             return
 
+        # Resolve every instrument first, then subscribe in a single round-trip
+        instruments, names = [], []
         for sym in symbols:
             try:
                 exchange = sym.get("exchange", "NSE")
                 token = sym.get("token")
-                name = sym.get("name", str(token))
-                
-                instrument = self.alice.get_instrument_by_token(exchange, token)
-                
-                # Intelligent feed type selection
-                is_index = "NIFTY" in name.upper() or "SENSEX" in name.upper()
-                feed_type = None
-                priority = ["TICK_DATA", "MARKET_DATA", "INDEX"] if is_index else ["TICK_DATA", "MARKET_DATA", "DEPTH_DATA"]
-                
-                for attr in priority:
-                    if hasattr(LiveFeedType, attr):
-                        feed_type = getattr(LiveFeedType, attr)
-                        break
-                
-                # Standard subscription call
+                instruments.append(resolve_instrument(self.alice, exchange, token))
+                names.append(sym.get("name", str(token)))
+            except Exception as e:
+                print(f"[ADAPTER] Instrument lookup error for {sym}: {e}")
+
+        if not instruments:
+            return
+
+        try:
+            self.alice.subscribe(instruments)
+            print(f"[ADAPTER] Subscribed to {', '.join(names)}")
+        except Exception:
+            # Fallback for older SDK versions that only take one instrument per call
+            for instrument, name in zip(instruments, names):
                 try:
-                    self.alice.subscribe([instrument])
-                    print(f"[ADAPTER] Subscribed to {name}")
-                except Exception:
-                    # Fallback for older SDK versions
                     self.alice.subscribe(instrument)
                     print(f"[ADAPTER] Subscribed to {name} (fallback method)")
-                    
-            except Exception as e:
-                print(f"[ADAPTER] Subscription error for {sym}: {e}")
+                except Exception as e:
+                    print(f"[ADAPTER] Subscription error for {name}: {e}")
 
     async def get_snapshot(self, exchange: str, token: int) -> Optional[Dict[str, Any]]:
         """Fetch a single scrip data snapshot via REST."""
@@ -160,8 +234,8 @@ class AliceBlueAdapter(BrokerDataAdapter):
             return None
         
         try:
-            instrument = self.alice.get_instrument_by_token(exchange, token)
-            res = self.alice.get_scrip_info(instrument)
+            instrument = resolve_instrument(self.alice, exchange, token)
+            res = build_scrip_quote(self.alice, instrument)()
             
             if res and res.get('stat') == 'Ok':
                 # Explicitly check for presence of data to avoid false 0.0
@@ -192,7 +266,10 @@ class AliceBlueAdapter(BrokerDataAdapter):
                 stopper = getattr(self.alice, "stop_websocket", None) or getattr(self.alice, "close_websocket", None)
                 if callable(stopper):
                     stopper()
-                self.alice = None
                 print("[ADAPTER] WebSocket disconnected.")
-            except:
-                pass
+            except Exception as e:
+                # No socket yet (pya3 only sets alice.ws once the handshake succeeds)
+                print(f"[ADAPTER] WebSocket stop skipped: {e}")
+            finally:
+                self.alice = None
+                self.is_connected = False
@@ -0,0 +1,130 @@
+"""
+Shared AliceBlue REST plumbing.
+
+  - One keep-alive requests.Session for broker REST calls, including pya3's _request-based
+    calls (login, quotes, orders); start_websocket's session calls and get_contract_master
+    still use bare requests inside pya3
+  - Instrument lookups resolved once per (exchange, token)
+  - Scrip quote requests prebuilt per instrument (url, headers, payload)
+  - pya3 internals are only used when present; otherwise the public client calls are kept
+  - TOTP codes computed once per 30-second step for logins/reconnects
+"""
+
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Tuple
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+SCRIP_QUOTE_TIMEOUT = 0.8  # seconds; pollers run every 1.5s
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+BROKER_SESSION = _build_session()
+
+# Private Aliceblue members the shared-session paths rely on (present in pya3 1.0.30)
+_PYA3_INTERNALS = ("_request", "_user_agent", "_user_authorization", "_sub_urls", "base")
+
+def _has_internals(alice) -> bool:
+    return all(hasattr(alice, name) for name in _PYA3_INTERNALS)
+
+def _session_request(alice, method, req_type, data=None):
+    """Drop-in for Aliceblue._request that goes through BROKER_SESSION instead of bare requests.post/get."""
+    headers = {
+        "X-SAS-Version": "2.0",
+        "User-Agent": alice._user_agent(),
+        "Authorization": alice._user_authorization()
+    }
+    send = BROKER_SESSION.post if req_type == "POST" else BROKER_SESSION.get
+    try:
+        response = send(method, json=data, headers=headers)
+    except (requests.ConnectionError, requests.Timeout) as exception:
+        return {'stat': 'Not_ok', 'emsg': exception, 'encKey': None}
+    if response.status_code == 200:
+        return orjson.loads(response.content)
+    emsg = str(response.status_code) + ' - ' + response.reason
+    return {'stat': 'Not_ok', 'emsg': emsg, 'encKey': None}
+
+def attach_shared_session(alice):
+    """Route this Aliceblue client's _request-based calls (login, quotes, orders) over the shared session."""
+    if _has_internals(alice):
+        alice._request = partial(_session_request, alice)
+    return alice
+
+# pya3's get_instrument_by_token re-reads the whole contract CSV on every call
+_instruments: Dict[Tuple[str, Any], Any] = {}
+_instruments_lock = threading.Lock()
+
+def resolve_instrument(alice, exchange: str, token):
+    """Return the pya3 Instrument for (exchange, token), resolving it only once."""
+    key = (exchange, token)
+    inst = _instruments.get(key)
+    if inst is None:
+        with _instruments_lock:
+            inst = _instruments.get(key)
+            if inst is None:
+                inst = alice.get_instrument_by_token(exchange, token)
+                if isinstance(inst, dict):  # pya3 error response: don't cache
+                    raise ValueError(inst.get("emsg", f"Unknown instrument {exchange}:{token}"))
+                _instruments[key] = inst
+    return inst
+
+def build_scrip_quote(alice, instrument) -> Callable[[], Dict[str, Any]]:
+    """
+    Prebuild the request Aliceblue.get_scrip_info would send for this instrument.
+    Returns a no-argument fetcher; falls back to alice.get_scrip_info when pya3's internals are missing.
+    """
+    if not _has_internals(alice):
+        return partial(alice.get_scrip_info, instrument)
+    url = alice.base + alice._sub_urls["scripdetails"]
+    headers = {
+        "X-SAS-Version": "2.0",
+        "User-Agent": alice._user_agent(),
+        "Authorization": alice._user_authorization()
+    }
+    payload = {"exch": instrument.exchange, "symbol": str(instrument.token)}
+    return partial(fetch_scrip_quote, (url, headers, payload))
+
+def fetch_scrip_quote(request: Tuple[str, Dict[str, str], Dict[str, str]]) -> Dict[str, Any]:
+    """POST a prebuilt scrip quote request over the shared session (pya3-style response dict)."""
+    url, headers, payload = request
+    try:
+        response = BROKER_SESSION.post(url, json=payload, headers=headers, timeout=SCRIP_QUOTE_TIMEOUT)
+    except requests.RequestException as e:
+        return {"stat": "Not_ok", "emsg": str(e)}
+    if response.status_code != 200:
+        return {"stat": "Not_ok", "emsg": f"{response.status_code} - {response.reason}"}
+    return orjson.loads(response.content)
+
+class CachedTOTP:
+    """pyotp.TOTP wrapper that computes the HMAC once per time step instead of on every login."""
+
+    def __init__(self, secret: str):
+        import pyotp
+        self._totp = pyotp.TOTP(secret)
+        self._step = None
+        self._code = None
+
+    def now(self) -> str:
+        step = int(time.time() // self._totp.interval)
+        if step != self._step:
+            self._code = self._totp.now()
+            self._step = step
+        return self._code
+
+_totps: Dict[str, CachedTOTP] = {}
+
+def totp_now(secret: str) -> str:
+    """Current TOTP code for `secret`, shared by the equity and commodity logins."""
+    totp = _totps.get(secret)
+    if totp is None:
+        totp = _totps[secret] = CachedTOTP(secret)
+    return totp.now()
@@ -21,8 +21,7 @@ Safety:
 import os
 import asyncio
 import time
-import json
-import hashlib
+import orjson
 import threading
 import traceback
 from datetime import datetime
@@ -55,6 +54,8 @@ try:
 except ImportError:
     Aliceblue = None
 
+from .broker_rest import build_scrip_quote, totp_now, attach_shared_session
+
 
 # ============================================================
 # CONSTANTS
@@ -70,6 +71,9 @@ MCX_TRADING_DAYS = {0, 1, 2, 3, 4}  # Mon-Fri
 # Reconnection backoff schedule (seconds)
 BACKOFF_SCHEDULE = [1, 2, 5, 10, 30]
 
+# Max WS tick age (seconds) trusted while the socket is open; older ticks get REST polled
+WS_STALE_LIMIT = 45
+
 LOG_PREFIX = "[COMMODITY-LDM]"
 
 
@@ -128,7 +132,9 @@ class CommodityLiveManager:
         # --- Internal pointers ---
         self._alice = None
         self._ws_thread: Optional[threading.Thread] = None
-        self._rest_threads: List[threading.Thread] = []
+        self._ws_open = False  # Set by the WS open/close callbacks
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # Home loop for the REST poll task
+        self._rest_task: Optional[asyncio.Task] = None
         self._reconnect_task = None
         self._running = False
         self._callbacks: List[Callable] = []
@@ -169,15 +175,16 @@ class CommodityLiveManager:
                 return
             self.status = "CONNECTING"
 
+        self._loop = asyncio.get_running_loop()
         print(f"{LOG_PREFIX} Starting commodity live feed...")
 
         try:
-            # 1. Authenticate
-            if not self._authenticate():
+            # 1. Authenticate (blocking HTTP: off the event loop)
+            if not await asyncio.to_thread(self._authenticate):
                 raise Exception("Authentication failed")
 
             # 2. Resolve contracts
-            self._resolve_contracts()
+            await asyncio.to_thread(self._resolve_contracts)
 
             if not self.resolved_instruments:
                 raise Exception("No commodity contracts resolved")
@@ -194,6 +201,11 @@ class CommodityLiveManager:
             print(f"{LOG_PREFIX} ✅ Commodity live feed CONNECTED. "
                   f"Tracking: {list(self.resolved_instruments.keys())}")
 
+        except asyncio.CancelledError:
+            with self._lock:
+                self.status = "DISCONNECTED"
+            print(f"{LOG_PREFIX} Start cancelled.")
+            raise
         except Exception as e:
             print(f"{LOG_PREFIX} ❌ Start failed: {e}")
             traceback.print_exc()
@@ -234,9 +246,13 @@ class CommodityLiveManager:
         except Exception as e:
             print(f"{LOG_PREFIX} WS stop error: {e}")
 
+        if self._rest_task:
+            self._rest_task.cancel()
+            self._rest_task = None
+
         self._alice = None
         self._ws_thread = None
-        self._rest_threads = []
+        self._ws_open = False
 
         print(f"{LOG_PREFIX} Commodity feed stopped. Cache cleared.")
 
@@ -280,9 +296,9 @@ class CommodityLiveManager:
 
         try:
             print(f"{LOG_PREFIX} Authenticating user {self._user_id}...")
-            self._alice = Aliceblue(user_id=self._user_id, api_key=self._api_key)
+            self._alice = attach_shared_session(Aliceblue(user_id=self._user_id, api_key=self._api_key))
 
-            totp = pyotp.TOTP(self._totp_secret).now() if pyotp else None
+            totp = totp_now(self._totp_secret) if pyotp else None
             if not totp:
                 print(f"{LOG_PREFIX} pyotp not available.")
                 return False
@@ -501,22 +517,26 @@ class CommodityLiveManager:
                     run_in_background=True
                 )
 
-                # Wait for connection then subscribe
+                # Wait for connection (up to 7.5s) then subscribe
                 for _ in range(15):
                     if not self._running:
                         return
+                    if self._ws_open:
+                        break
                     time.sleep(0.5)
 
-                # Subscribe to all resolved instruments
-                for sym, inst in self.resolved_instruments.items():
-                    try:
+                # Subscribe to all resolved instruments in one call
+                try:
+                    self._alice.subscribe(instruments)
+                    print(f"{LOG_PREFIX} 📡 WS subscribed: {list(self.resolved_instruments.keys())}")
+                except Exception:
+                    # Fallback for SDK versions that take one instrument per call
+                    for sym, inst in self.resolved_instruments.items():
                         try:
-                            self._alice.subscribe([inst])
-                        except Exception:
                             self._alice.subscribe(inst)
-                        print(f"{LOG_PREFIX} 📡 WS subscribed: {sym}")
-                    except Exception as e:
-                        print(f"{LOG_PREFIX} WS subscribe error ({sym}): {e}")
+                            print(f"{LOG_PREFIX} 📡 WS subscribed: {sym}")
+                        except Exception as e:
+                            print(f"{LOG_PREFIX} WS subscribe error ({sym}): {e}")
 
             except Exception as e:
                 print(f"{LOG_PREFIX} WS worker error: {e}")
@@ -527,9 +547,11 @@ class CommodityLiveManager:
         self._ws_thread.start()
 
     def _on_ws_open(self):
+        self._ws_open = True
         print(f"{LOG_PREFIX} 📡 WebSocket CONNECTED")
 
     def _on_ws_close(self):
+        self._ws_open = False
         print(f"{LOG_PREFIX} WebSocket CLOSED")
         if self._running:
             self._handle_disconnect()
@@ -547,7 +569,7 @@ class CommodityLiveManager:
 
         try:
             if isinstance(message, str):
-                message = json.loads(message)
+                message = orjson.loads(message)
             if not isinstance(message, dict):
                 return
 
@@ -592,8 +614,8 @@ class CommodityLiveManager:
                 except Exception as e:
                     print(f"{LOG_PREFIX} Callback error: {e}")
 
-        except Exception as e:
-            # Silently handle bad ticks — never crash
+        except (ValueError, TypeError):
+            # Malformed JSON or numeric field: drop the tick (anything else is a bug and surfaces)
             pass
 
     # ----------------------------------------------------------
@@ -601,69 +623,96 @@ class CommodityLiveManager:
     # ----------------------------------------------------------
 
     def _start_rest_pollers(self):
-        """Start REST polling threads for each commodity (fallback when WS is silent)."""
+        """Start the REST polling task (fallback when WS is silent). Safe to call from any thread."""
         self._running = True
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._spawn_rest_task)
+
+    def _spawn_rest_task(self):
+        """(Re)create the single REST poll task on the home loop."""
+        if self._rest_task:
+            self._rest_task.cancel()
+        self._rest_task = self._loop.create_task(self._rest_poll_loop())
+        print(f"{LOG_PREFIX} 🔄 REST poller started: {list(self.resolved_instruments.keys())}")
 
-        for sym, inst in self.resolved_instruments.items():
-            t = threading.Thread(
-                target=self._rest_poll_worker,
-                args=(sym, inst),
-                daemon=True
-            )
-            t.start()
-            self._rest_threads.append(t)
-            print(f"{LOG_PREFIX} 🔄 REST poller started: {sym}")
-
-    def _rest_poll_worker(self, symbol: str, instrument):
+    def _ws_fresh(self, symbol: str) -> bool:
         """
-        Independent REST polling worker for a single commodity.
-        Only polls when WebSocket has been silent for >3 seconds.
+        True if the WebSocket covers this symbol: its last WS tick is under
+        WS_STALE_LIMIT seconds old while the socket is open (quiet contracts),
+        or under 3 seconds old once the socket is down.
         """
-        while self._running:
-            try:
-                # Check if WS is providing data
-                with self._lock:
-                    cached = self.commodity_market_cache.get(symbol, {})
-                    last_ts = cached.get("timestamp", "")
+        with self._lock:
+            cached = self.commodity_market_cache.get(symbol, {})
+            last_ts = cached.get("timestamp", "")
 
-                ws_fresh = False
-                if last_ts and cached.get("source") == "WS":
-                    try:
-                        last_dt = datetime.fromisoformat(last_ts)
-                        ws_fresh = (datetime.now() - last_dt).total_seconds() < 3.0
-                    except Exception:
-                        pass
+        if cached.get("source") != "WS" or not last_ts:
+            return False
+        try:
+            age = (datetime.now() - datetime.fromisoformat(last_ts)).total_seconds()
+        except ValueError:
+            return False
+        # An open socket can still silently stop delivering a contract: cap how long we trust it
+        return age < (WS_STALE_LIMIT if self._ws_open else 3.0)
+
+    async def _rest_poll_loop(self):
+        """
+        Single polling task for all commodities.
+        Only polls symbols the WebSocket does not cover (see _ws_fresh);
+        the blocking pya3 calls for one round run concurrently off the loop.
+        """
+        # Quote requests are prebuilt once per (re)start: the session header only changes on re-auth
+        alice = self._alice
+        quote_fetchers = {sym: build_scrip_quote(alice, inst)
+                          for sym, inst in list(self.resolved_instruments.items())} if alice else {}
+        # Bind per-round callables once
+        ws_fresh = self._ws_fresh
+        apply_quote = self._apply_rest_quote
+        to_thread = asyncio.to_thread
+
+        while self._running:
+            stale = [sym for sym in quote_fetchers if not ws_fresh(sym)]
 
-                # Only poll if WS is stale
-                if not ws_fresh and self._alice:
+            if stale and self._alice:
+                results = await asyncio.gather(
+                    *(to_thread(quote_fetchers[sym]) for sym in stale),
+                    return_exceptions=True
+                )
+                for symbol, res in zip(stale, results):
+                    # Network errors already come back as Not_ok dicts from the fetchers
+                    if isinstance(res, Exception):
+                        print(f"{LOG_PREFIX} REST poll error ({symbol}): {res}")
+                        continue
                     try:
-                        res = self._alice.get_scrip_info(instrument)
-                        if res and res.get('stat') == 'Ok':
-                            ltp = float(res.get('LTP', 0) or 0)
-                            if ltp > 0:
-                                now_iso = datetime.now().isoformat()
-                                with self._lock:
-                                    self.commodity_market_cache[symbol] = {
-                                        "ltp": ltp,
-                                        "bid": float(res.get('bp1', 0) or 0),
-                                        "ask": float(res.get('sp1', 0) or 0),
-                                        "volume": int(float(res.get('v', 0) or 0)),
-                                        "open_interest": int(float(res.get('oi', 0) or 0)),
-                                        "close": float(res.get('c', 0) or 0),
-                                        "expiry": self._expiry_map.get(symbol, ""),
-                                        "timestamp": now_iso,
-                                        "source": "REST",
-                                        "status": "LIVE"
-                                    }
-                                    self.last_update = now_iso
-                    except Exception:
-                        pass  # Never crash on REST failure
-
-            except Exception:
-                pass
+                        apply_quote(symbol, res)
+                    except (ValueError, TypeError):
+                        pass  # Malformed numeric field in the quote
 
             # Poll interval: 1.5 seconds
-            time.sleep(1.5)
+            await asyncio.sleep(1.5)
+
+    def _apply_rest_quote(self, symbol: str, res):
+        """Write one successful get_scrip_info response into the cache."""
+        if not isinstance(res, dict) or res.get('stat') != 'Ok':
+            return
+        ltp = float(res.get('LTP', 0) or 0)
+        if ltp <= 0:
+            return
+        now_iso = datetime.now().isoformat()
+        with self._lock:
+            self.commodity_market_cache[symbol] = {
+                "ltp": ltp,
+                "bid": float(res.get('bp1', 0) or 0),
+                "ask": float(res.get('sp1', 0) or 0),
+                "volume": int(float(res.get('v', 0) or 0)),
+                "open_interest": int(float(res.get('oi', 0) or 0)),
+                "close": float(res.get('c', 0) or 0),
+                "expiry": self._expiry_map.get(symbol, ""),
+                "timestamp": now_iso,
+                "source": "REST",
+                "status": "LIVE"
+            }
+            self.last_update = now_iso
 
     # ----------------------------------------------------------
     # RECONNECTION LOGIC
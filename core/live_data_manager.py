@@ -1,11 +1,12 @@
 
 import asyncio
 import time
-import json
+import orjson
 import threading
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Callable
 from .broker_adapter import AliceBlueAdapter, BrokerDataAdapter
+from shared.data_bus import DataBus
 
 class LiveDataManager:
     _instance = None
@@ -69,7 +70,15 @@ class LiveDataManager:
             )
 
         # Attempt Connection
-        connected = await self.adapter.connect()
+        try:
+            connected = await self.adapter.connect()
+        except asyncio.CancelledError:
+            # Engine task replaced mid-connect (mode switch): don't leave the status stuck at CONNECTING
+            async with self.lock:
+                self.status = "DISCONNECTED"
+                await self.adapter.disconnect()
+            print("[LDM] Connection attempt cancelled.")
+            raise
         
         async with self.lock:
             if connected:
@@ -132,7 +141,7 @@ class LiveDataManager:
             pseudo_msg = {"tk": token, "ts": symbol_name, "lp": snap["ltp"], "v": snap["volume"], "c": snap["close"]}
             for cb in self.callbacks:
                 try: cb(pseudo_msg)
-                except: pass
+                except Exception as e: print(f"[LDM] Callback error: {e}")
                 
             return tick_data
         return None
@@ -141,8 +150,8 @@ class LiveDataManager:
         """Standard tick processing bridged from Adapter"""
         if isinstance(message, str):
             try:
-                message = json.loads(message)
-            except:
+                message = orjson.loads(message)
+            except ValueError:
                 return
 
         if not isinstance(message, dict):
@@ -155,6 +164,7 @@ class LiveDataManager:
 
         # Use token as fallback symbol name
         symbol = message.get("ts", str(token))
+        now_iso = datetime.now().isoformat() # Formatted once per tick, shared by entry and last_update
         
         try:
             tick_data = {
@@ -162,7 +172,7 @@ class LiveDataManager:
                 "bid": float(message.get("bp1", 0) or 0),
                 "ask": float(message.get("sp1", 0) or 0),
                 "volume": float(message.get("v", 0) or 0),
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
                 "raw": message
             }
         except (ValueError, TypeError):
@@ -174,14 +184,10 @@ class LiveDataManager:
         # Update Cache
         with self.sync_lock:
              self.market_cache[symbol] = tick_data
-             self.last_update = datetime.now().isoformat()
+             self.last_update = now_iso
 
         # Update legacy DataBus for backward compatibility
-        try:
-            from shared.data_bus import DataBus
-            DataBus().update_data(symbol, tick_data)
-        except:
-            pass
+        DataBus().update_data(symbol, tick_data)
 
         # Execute Callbacks
         for cb in self.callbacks:
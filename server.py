@@ -1,19 +1,23 @@
 
 import os
 import asyncio
-import json
+import operator
 import threading
 import time
 import datetime
 import hashlib
-import pyotp
+import orjson
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, Response
 import uvicorn
 from dotenv import load_dotenv
-import websocket
-from pya3 import Aliceblue
 
 # --- CORE IMPORTS ---
 from core.live_data_manager import LiveDataManager
@@ -34,11 +38,56 @@ API_KEY = os.getenv("ALICEBLUE_API_KEY")
 USER_ID = os.getenv("ALICEBLUE_USER_ID")
 TOTP_SECRET = os.getenv("ALICEBLUE_TOTP_SECRET")
 
+# Credentials are deployment constants: evaluate once at import
+CREDS_OK = bool(API_KEY and USER_ID and TOTP_SECRET)
+_USER_LOG_PREFIX = f"USER:{USER_ID}" if USER_ID else "USER:SYSTEM"
+
 # Fail-fast check for critical credentials
-if not all([API_KEY, USER_ID, TOTP_SECRET]):
+if not CREDS_OK:
     print("❌ CRITICAL: Missing ALICEBLUE_API_KEY, ALICEBLUE_USER_ID, or ALICEBLUE_TOTP_SECRET in .env")
     print("❌ Algo system will start in MOCK/SIMULATION mode only.")
 
+# Core instruments streamed by the data engine (static broker tokens)
+SYMBOLS_MGR = MappingProxyType({
+    "NIFTY": {"exch": "NSE", "token": 26000, "segment": "NSE"},
+    "BANKNIFTY": {"exch": "NSE", "token": 26009, "segment": "NSE"},
+    "SENSEX": {"exch": "BSE", "token": 1, "segment": "BSE"},
+    "GOLD": {"exch": "MCX", "token": 454819, "segment": "MCX"},
+    "SILVER": {"exch": "MCX", "token": 451667, "segment": "MCX"},
+    "CRUDEOIL": {"exch": "MCX", "token": 488292, "segment": "MCX"},
+    "NATGASMINI": {"exch": "MCX", "token": 488509, "segment": "MCX"}
+})
+TOKEN_MAP = MappingProxyType({str(cfg['token']): name for name, cfg in SYMBOLS_MGR.items()})
+
+# Base prices for the virtual feed (indices/commodities)
+SIM_BASES = MappingProxyType({
+    "NIFTY": 24500.0, "BANKNIFTY": 52000.0, "SENSEX": 81000.0,
+    "GOLD": 72000.0, "SILVER": 88000.0, "CRUDEOIL": 6400.0, "NATGASMINI": 180.0
+})
+
+# Data connection status message reported by /api/v1/system/mode
+DATA_STATUS_MSG = MappingProxyType({
+    "MOCK": "Internal Mock Data (Isolated)",
+    "SIMULATION": "Simulated Feed Active",
+    "PAPER": "Live Data Enabled (Virtual Execution)",
+    "REAL": "Live Data + Live Execution ACTIVE"
+})
+
+TICK_QUEUE_SIZE = 1024
+TRADES_MAXLEN = 50 # Same window the execution engine used to trim to by hand
+TICK_ERROR_INTERVAL = 5.0 # seconds between logged malformed-tick errors
+
+def put_latest(queue, item):
+    """put_nowait that evicts the oldest entry when the queue is full (engine loop only)"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+@lru_cache(maxsize=256)
+def iso_second(sec):
+    """ISO timestamp for an epoch second; log entries are formatted on read, not on append"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+
 class GlobalExchangeState:
     def __init__(self):
         self.metrics = {
@@ -48,6 +97,8 @@ class GlobalExchangeState:
             "max_drawdown": 0.0,
             "risk_used_percent": 0.0
         }
+        # Copy-on-write snapshot: the dict and its entries are never mutated once published.
+        # Writers go through publish_market_data; readers grab state.market_data once, no lock
         self.market_data = {
             "NIFTY": {"ltp": None, "close": None, "volume": None, "status": "INITIAL", "timestamp": 0},
             "BANKNIFTY": {"ltp": None, "close": None, "volume": None, "status": "INITIAL", "timestamp": 0},
@@ -56,12 +107,13 @@ class GlobalExchangeState:
         self.active_symbol = "NIFTY"
         self.active_exch = "NSE"
         self.search_mgr = SymbolSearchManager()
-        self.trades = []
+        self.trades = deque(maxlen=TRADES_MAXLEN) # Bounded; oldest trades drop off as new ones land
         self.managed_users = [
             {"user_id": "admin@antigravity.ia", "role": "OWNER", "status": "ACTIVE", "sync": "OFFLINE"}
         ]
+        self.managed_users_by_id = {u["user_id"]: u for u in self.managed_users} # O(1) duplicate checks
         self.market_feed_active = True # Allows pausing data polling
-        self.logs = []
+        self.logs = deque(maxlen=100) # Bounded: oldest entries drop off in O(1)
         self.risk_rules = {
             "max_trades_per_day": 3,
             "risk_per_trade_percent": 1.0,
@@ -71,19 +123,37 @@ class GlobalExchangeState:
         self.execution_mode = "PAPER"  # Set to PAPER by default for immediate live data
         self.is_running = False
         self.alice = None
-        self.lock = threading.RLock()
+        self.lock = threading.Lock() # Non-reentrant: never call back into locking helpers while held
+        self._market_data_lock = threading.Lock() # Writer-only lock for market_data snapshots
         self.engine_running = False
         self.websocket_instance = None
         self.data_engine_status = "DISCONNECTED" # DISCONNECTED | CONNECTING | CONNECTED
-        self.monitored_instruments = {"NIFTY", "BANKNIFTY", "SENSEX", "GOLD", "SILVER", "CRUDEOIL", "NATGASMINI"}
+        # Immutable snapshot, swapped wholesale on change so tick handlers never see a partial update
+        self.monitored_instruments = frozenset({"NIFTY", "BANKNIFTY", "SENSEX", "GOLD", "SILVER", "CRUDEOIL", "NATGASMINI"})
         self.market_segments = {
             "NSE": {"open": "09:15", "close": "15:30", "days": [0,1,2,3,4]},
             "BSE": {"open": "09:15", "close": "15:30", "days": [0,1,2,3,4]},
             "MCX": {"open": "09:00", "close": "23:30", "days": [0,1,2,3,4]}
         }
-        self.token_map = {} # Dynamic token-to-symbol mapping
-        self.agent_queue = asyncio.Queue() # Performance: Queue for analytical tasks
+        self._segment_masks = self.build_segment_masks()
+        self.token_map = {} # Dynamic token-to-symbol mapping (static tokens live in TOKEN_MAP)
+        # Bounded (drop-oldest via put_latest) so a stalled consumer can't grow memory unbounded
+        self.tick_queue = asyncio.Queue(maxsize=TICK_QUEUE_SIZE) # Raw broker ticks, drained by tick_reader on the engine loop
+        # Latest unprocessed tick per symbol for the agent pipeline; newer ticks supersede unseen ones.
+        # Only touched on the engine loop, so no lock is needed
+        self.pending_ticks = {}
+        self.pending_event = asyncio.Event()
         self._worker_task = None
+        self._reader_task = None
+        self._pnl_task = None
+        # Dedicated, bounded pool for agent pipeline batches (never one thread per tick).
+        # Single worker: agents (e.g. ExecutionEngine trade ids) are not thread-safe, runs stay ordered
+        self.pipeline_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent")
+        self.engine_loop = None # Server event loop (set on startup): hosts the data engine, worker and simulator
+        self.engine_task = None # Current data engine start/stop task; replaced on every mode switch
+        self.simulation_task = None
+        self._metrics_cache = (0.0, None) # (built_at, response) for the dashboard metrics poll
+        self._json_cache = {} # key -> (payload bytes, etag) for read-mostly endpoints
 
         # --- COMMODITY LIVE DATA MANAGER (Non-intrusive, read-only) ---
         self.commodity_manager = CommodityLiveManager()
@@ -106,27 +176,103 @@ class GlobalExchangeState:
         self.agent_manager.register_agent("AuditLogger", self.audit_agent)
         self.agent_manager.register_agent("Guidance", self.guide_agent)
 
+    def build_segment_masks(self):
+        """Precompute a minute-of-week open/closed bitmap (7 x 1440) per market segment"""
+        masks = {}
+        for segment, cfg in self.market_segments.items():
+            oh, om = map(int, cfg["open"].split(":"))
+            ch, cm = map(int, cfg["close"].split(":"))
+            open_min, close_min = oh * 60 + om, ch * 60 + cm
+            mask = bytearray(7 * 1440)
+            for day in cfg["days"]:
+                start = day * 1440 + open_min
+                mask[start:start + close_min - open_min + 1] = b"\x01" * (close_min - open_min + 1)
+            masks[segment] = bytes(mask)
+        return masks
+
+    def publish_market_data(self, name, fields, replace=False):
+        """RCU-style publish: copy the snapshot, set one entry (merged unless `replace`), swap the reference"""
+        with self._market_data_lock: # Only serializes writers (feed thread, commodity WS, engine loop)
+            snapshot = dict(self.market_data)
+            snapshot[name] = fields if replace else {**snapshot.get(name, {}), **fields}
+            self.market_data = snapshot
+
     def add_log(self, message):
-        ts = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-        with self.lock:
-            self.logs.append({"timestamp": ts, "message": message})
-            if len(self.logs) > 100: self.logs.pop(0)
+        # Raw epoch; formatted lazily in get_logs. deque.append is atomic under the GIL, no lock needed
+        self.logs.append({"timestamp": time.time(), "message": message})
 
 state = GlobalExchangeState()
 
 # ---------------- ALICE BLUE ENGINE ---------------- #
 
-def is_market_open(segment):
-    """Check if market segment is currently open in IST"""
+def minute_of_week():
+    """Index into the segment masks for the current local minute"""
     now = datetime.datetime.now()
+    return now.weekday() * 1440 + now.hour * 60 + now.minute
+
+def is_market_open(segment, minute=None):
+    """Check if market segment is currently open in IST (pass minute to reuse one clock read)"""
+    mask = state._segment_masks.get(segment)
     # If segment unknown, assume open to be safe
-    if segment not in state.market_segments: return True
-    
-    cfg = state.market_segments[segment]
-    if now.weekday() not in cfg["days"]: return False
-    
-    current_time_str = now.strftime("%H:%M")
-    return cfg["open"] <= current_time_str <= cfg["close"]
+    if mask is None: return True
+
+    if minute is None:
+        minute = minute_of_week()
+    return mask[minute] == 1
+
+def server_tick_handler(msg):
+    """LDM callback (pya3 socket thread): hand the raw tick to the engine loop, nothing else"""
+    state.engine_loop.call_soon_threadsafe(put_latest, state.tick_queue, msg)
+
+def handle_live_tick(msg):
+    """Apply one broker tick; runs only on the engine loop via tick_reader"""
+    if msg is None or not isinstance(msg, dict): return
+    token = msg.get('tk')
+    if not token: return
+    is_running = state.is_running # Read once; dispatch is skipped entirely when idle
+
+    key = str(token)
+    name = TOKEN_MAP.get(key)
+    if name is None:
+        name = state.token_map.get(key) # Single-key dict read: atomic, no lock needed
+
+    if not name or name not in state.monitored_instruments: return
+
+    # Missing/empty fields fall through `or 0` instead of raising
+    ltp = float(msg.get('lp') or 0)
+    if ltp <= 0: return # Ignore invalid ticks
+
+    close = float(msg.get('c') or 0) or ltp
+    volume = float(msg.get('v') or 0)
+
+    state.publish_market_data(name, {
+        "ltp": ltp,
+        "volume": volume,
+        "close": close,
+        "timestamp": time.time(),
+        "status": "LIVE"
+    })
+
+    if is_running:
+        # Same loop as agent_worker, so it can be fed directly
+        submit_tick(name, ltp, close)
+
+async def tick_reader():
+    """Single consumer for broker ticks marshalled onto the engine loop"""
+    last_error = 0.0
+    # Bind per-tick callables once (LOAD_FAST instead of attribute/global lookups every tick)
+    get = state.tick_queue.get
+    handle = handle_live_tick
+    while True:
+        msg = await get()
+        try:
+            handle(msg)
+        except Exception as e:
+            # Malformed tick: keep consuming, log at most once per TICK_ERROR_INTERVAL
+            now = time.time()
+            if now - last_error >= TICK_ERROR_INTERVAL:
+                last_error = now
+                state.add_log(f"Tick Error ({msg.get('tk')}): {e}")
 
 async def start_data_engine():
     """WebSocket engine to receive live market ticks via LiveDataManager"""
@@ -140,30 +286,16 @@ async def start_data_engine():
         state.add_log("Data engine already active.")
         return
     
-    symbols_mgr = {
-        "NIFTY": {"exch": "NSE", "token": 26000, "segment": "NSE"},
-        "BANKNIFTY": {"exch": "NSE", "token": 26009, "segment": "NSE"},
-        "SENSEX": {"exch": "BSE", "token": 1, "segment": "BSE"},
-        "GOLD": {"exch": "MCX", "token": 454819, "segment": "MCX"},
-        "SILVER": {"exch": "MCX", "token": 451667, "segment": "MCX"},
-        "CRUDEOIL": {"exch": "MCX", "token": 488292, "segment": "MCX"},
-        "NATGASMINI": {"exch": "MCX", "token": 488509, "segment": "MCX"}
-    }
-    
-    with state.lock:
-        for name, cfg in symbols_mgr.items():
-            state.token_map[str(cfg['token'])] = name
-    
     try:
         # Check environment variables
-        if not API_KEY or not USER_ID or not TOTP_SECRET:
+        if not CREDS_OK:
             raise Exception("Broker credentials missing in .env")
 
         ldm.set_credentials(USER_ID, API_KEY, TOTP_SECRET)
 
         # Prepare symbol list for the manager
         sub_list = []
-        for name, cfg in symbols_mgr.items():
+        for name, cfg in SYMBOLS_MGR.items():
             if name in state.monitored_instruments:
                 sub_list.append({
                     "exchange": cfg['exch'],
@@ -171,45 +303,10 @@ async def start_data_engine():
                     "name": name
                 })
                 # Initialize state entry if missing
-                with state.lock:
-                    if name not in state.market_data:
-                        state.market_data[name] = {"ltp": None, "close": None, "volume": None, "status": "WAITING", "timestamp": 0, "segment": cfg['segment']}
-                    else:
-                        state.market_data[name]["segment"] = cfg['segment']
-
-        # Define bridge callback
-        def server_tick_handler(msg):
-            if msg is None or not isinstance(msg, dict): return
-            token = msg.get('tk')
-            if not token: return
-            
-            with state.lock:
-                name = state.token_map.get(str(token))
-            
-            if name and name in state.monitored_instruments:
-                try:
-                    ltp = float(msg.get('lp', 0))
-                    if ltp <= 0: return # Ignore invalid ticks
-
-                    close = float(msg.get('c', 0)) or ltp
-                    volume = float(msg.get('v', 0))
-                    
-                    with state.lock:
-                        state.market_data[name].update({
-                            "ltp": ltp,
-                            "volume": volume,
-                            "close": close,
-                            "timestamp": time.time(),
-                            "status": "LIVE"
-                        })
-                    
-                    if state.is_running:
-                        # Put in queue for worker instead of spawning new thread per tick
-                        # Since we are in a sync callback, we use call_soon_threadsafe if needed, 
-                        # but LDM handles this bridging
-                        state.agent_queue.put_nowait((name, ltp, close))
-                except Exception as e:
-                    state.add_log(f"Tick Error ({name}): {e}")
+                if name not in state.market_data:
+                    state.publish_market_data(name, {"ltp": None, "close": None, "volume": None, "status": "WAITING", "timestamp": 0, "segment": cfg['segment']})
+                else:
+                    state.publish_market_data(name, {"segment": cfg['segment']})
 
         # Register callback and start feed
         ldm.register_callback(server_tick_handler)
@@ -222,7 +319,7 @@ async def start_data_engine():
         state.add_log(f"Live Feed Broker connection failed: {str(e)}")
         if state.execution_mode in ["PAPER", "REAL"]:
             state.add_log(">>> INITIATING VIRTUAL FEED (STABILITY FALLBACK) <<<")
-            start_simulation_feed(symbols_mgr)
+            await start_simulation_feed(SYMBOLS_MGR)
 
     # --- START COMMODITY LIVE DATA (Non-intrusive, read-only) ---
     await start_commodity_data_engine()
@@ -237,6 +334,14 @@ async def stop_data_engine():
     # Also stop commodity data
     await stop_commodity_data_engine()
 
+async def replace_engine_task(coro):
+    """Cancel the in-flight engine start/stop task (if any) and run `coro` in its place"""
+    task = state.engine_task
+    if task and not task.done():
+        task.cancel()
+        await asyncio.wait([task])
+    state.engine_task = asyncio.create_task(coro)
+
 
 # ---- COMMODITY LIVE DATA ENGINE (Non-intrusive) ---- #
 
@@ -257,7 +362,7 @@ async def start_commodity_data_engine():
         return
 
     try:
-        if not API_KEY or not USER_ID or not TOTP_SECRET:
+        if not CREDS_OK:
             state.add_log("Commodity live feed: Missing broker credentials.")
             return
 
@@ -267,25 +372,15 @@ async def start_commodity_data_engine():
         def commodity_tick_bridge(symbol, data):
             """READ-ONLY bridge: Updates market_data state for UI consumption."""
             try:
-                with state.lock:
-                    if symbol in state.market_data:
-                        state.market_data[symbol].update({
-                            "ltp": data["ltp"],
-                            "volume": data["volume"],
-                            "close": data.get("close", data["ltp"]),
-                            "timestamp": time.time(),
-                            "status": "LIVE",
-                            "segment": "MCX"
-                        })
-                    else:
-                        state.market_data[symbol] = {
-                            "ltp": data["ltp"],
-                            "close": data.get("close", data["ltp"]),
-                            "volume": data["volume"],
-                            "timestamp": time.time(),
-                            "status": "LIVE",
-                            "segment": "MCX"
-                        }
+                # Runs on the commodity WS thread; readers never see a half-applied tick
+                state.publish_market_data(symbol, {
+                    "ltp": data["ltp"],
+                    "volume": data["volume"],
+                    "close": data.get("close", data["ltp"]),
+                    "timestamp": time.time(),
+                    "status": "LIVE",
+                    "segment": "MCX"
+                })
             except Exception:
                 pass  # Never crash on bridge errors
 
@@ -307,20 +402,47 @@ async def stop_commodity_data_engine():
     except Exception as e:
         state.add_log(f"Error stopping commodity feed: {e}")
 
+def submit_tick(symbol, ltp, close):
+    """Queue a tick for the agent pipeline, coalescing with any unprocessed tick for the symbol (engine loop only)"""
+    state.pending_ticks[symbol] = (ltp, close)
+    state.pending_event.set()
+
+PIPELINE_BATCH_WINDOW = 0.5 # seconds of ticks coalesced into one pipeline batch
+
 async def agent_worker():
-    """Worker loop to process ticks from the queue sequentially but non-blockingly"""
+    """Worker loop to process the newest pending tick per symbol in debounced batches"""
+    loop = asyncio.get_running_loop()
+    # Stable for the server's lifetime: bind once outside the loop (pending_ticks is swapped, so not hoisted)
+    run_in_executor = loop.run_in_executor
+    pool = state.pipeline_pool
+    event = state.pending_event
+    sleep = asyncio.sleep
     while True:
         try:
-            symbol, ltp, close = await state.agent_queue.get()
-            # Run the analytical pipeline in a separate thread if agents are sync
-            # or await if they are async. Looking at them, they seem sync.
-            # Using run_in_executor to keep the loop free
-            await asyncio.get_event_loop().run_in_executor(None, run_agent_pipeline, symbol, ltp, close)
-            state.agent_queue.task_done()
+            await event.wait()
+            # Debounce: let the window fill so each symbol runs at most once per batch
+            await sleep(PIPELINE_BATCH_WINDOW)
+            event.clear()
+            snapshot, state.pending_ticks = state.pending_ticks, {}
+            # Agents are sync: run the whole batch on the dedicated bounded pool to keep the loop free.
+            # Ticks arriving meanwhile coalesce for the next batch
+            await run_in_executor(pool, run_pipeline_batch, snapshot)
         except Exception as e:
             print(f"[WORKER] Error: {e}")
             await asyncio.sleep(1)
 
+def run_pipeline_batch(snapshot):
+    """Run the analytical chain for every symbol in the batch, then refresh guidance once"""
+    for symbol, (ltp, close) in snapshot.items():
+        try:
+            run_agent_pipeline(symbol, ltp, close)
+        except Exception as e:
+            print(f"[WORKER] Pipeline error ({symbol}): {e}")
+
+    # 6. Guidance & Strategy Pulse
+    # Consolidates all recent intelligence into a single summarizing advice (once per batch, not per tick)
+    state.guide_agent.generate_advice(state.agent_manager.get_audit_trail(10))
+
 def run_agent_pipeline(symbol, ltp, close):
     """Agent V2 Analytical Chain - Decoupled Routing"""
     # 1. Context Analysis (MarketContextAgent)
@@ -342,51 +464,80 @@ def run_agent_pipeline(symbol, ltp, close):
             # 5. Routed Execution (ExecutionAgent event triggered inside)
             # Use the signal name for execution routing
             state.exec_engine.route_execution(symbol, ltp, signal, state)
-    
-    # 6. Guidance & Strategy Pulse
-    # Consolidates all recent intelligence into a single summarizing advice
-    state.guide_agent.generate_advice(state.agent_manager.get_audit_trail(10))
 
-def start_simulation_feed(symbols):
-    """Fallback feed for when broker is not available"""
-    def simulate(name):
-        # Base prices for indices/commodities
-        bases = {
-            "NIFTY": 24500.0, "BANKNIFTY": 52000.0, "SENSEX": 81000.0,
-            "GOLD": 72000.0, "SILVER": 88000.0, "CRUDEOIL": 6400.0, "NATGASMINI": 180.0
-        }
-        ltp = bases.get(name, 100.0)
-        close = ltp - (ltp * 0.005) # simulate -0.5% opening
-        
-        while True:
-            import random
-            change = (random.random() - 0.48) * (ltp * 0.0001) # tiny realistic ticks
-            ltp += change
-            
-            with state.lock:
-                state.market_data[name] = {
-                    "ltp": round(ltp, 2),
-                    "volume": float(random.randint(10000, 50000)),
-                    "close": close,
-                    "timestamp": time.time(),
-                    "status": "VIRTUAL"
-                }
+SIM_TICK_INTERVAL = 1.5 # seconds between ticks for each simulated symbol
+SIM_RNG = np.random.default_rng()
+
+async def _simulation_loop(names):
+    """Single virtual tick generator fanning out over all instruments (runs on the engine loop)"""
+    count = len(names)
+    prices = np.array([SIM_BASES.get(name, 100.0) for name in names], dtype=np.float64)
+    closes = (prices - prices * 0.005).tolist() # simulate -0.5% opening
+    step = SIM_TICK_INTERVAL / count # stagger symbols across the interval
+    # Bind hot-loop callables as locals (LOAD_FAST instead of global/attribute lookups)
+    draw = SIM_RNG.random
+    draw_volumes = SIM_RNG.integers
+    now = time.time
+    sleep = asyncio.sleep
+    publish = state.publish_market_data
 
-            # Trigger Agents if system is running
+    while True:
+        # One vectorized draw per round instead of per-symbol scalar random calls
+        prices += (draw(count) - 0.48) * prices * 1e-4 # tiny realistic ticks
+        ltps = prices.tolist()
+        volumes = draw_volumes(10000, 50001, count).tolist()
+
+        for i, name in enumerate(names):
+            ltp, close = ltps[i], closes[i]
+            publish(name, {
+                "ltp": round(ltp, 2),
+                "volume": float(volumes[i]),
+                "close": close,
+                "timestamp": now(),
+                "status": "VIRTUAL"
+            }, replace=True)
+
+            # Trigger Agents if system is running (same path as the live feed, no thread per tick)
             if state.is_running:
-                # Run pipeline in background thread
-                threading.Thread(target=run_agent_pipeline, args=(name, ltp, close)).start()
-                
-            time.sleep(1.5)
+                submit_tick(name, ltp, close)
+
+            await sleep(step)
 
-    for name in symbols.keys():
-        t = threading.Thread(target=simulate, args=(name,))
-        t.daemon = True
-        t.start()
+async def start_simulation_feed(symbols):
+    """Fallback feed for when broker is not available"""
+    # Replace any previous simulator so repeated fallbacks don't stack duplicate feeds
+    if state.simulation_task:
+        state.simulation_task.cancel()
+    names = list(symbols)
+    if names:
+        state.simulation_task = asyncio.create_task(_simulation_loop(names))
 
 # ---------------- WEB SERVER ---------------- #
 
-app = FastAPI()
+class OrjsonResponse(Response):
+    """JSON response serialized with orjson (faster dashboard poll payloads)"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Adopt the server's event loop as the engine loop, run the data engine on it, and tear down on exit"""
+    state.engine_loop = asyncio.get_running_loop()
+    state._worker_task = asyncio.create_task(agent_worker())
+    state._reader_task = asyncio.create_task(tick_reader())
+    state._pnl_task = asyncio.create_task(pnl_ticker())
+    state.engine_task = asyncio.create_task(start_data_engine())
+    yield
+    # Stop the background loops and feeds, then release the agent pool's worker thread
+    for task in (state._worker_task, state._reader_task, state._pnl_task,
+                 state.engine_task, state.simulation_task):
+        if task:
+            task.cancel()
+    state.pipeline_pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan, default_response_class=OrjsonResponse)
 
 # Ensure static directory exists
 if not os.path.exists("static"):
@@ -412,113 +563,159 @@ async def register(request: Request):
 async def forgot_password(request: Request):
     return {"status": "success", "message": "Recovery link sent (Mock)"}
 
+METRICS_CACHE_TTL = 0.2 # seconds; still real-time for the UI
+PNL_TICK_INTERVAL = 1.0 # seconds between simulated PnL fluctuations
+
+async def pnl_ticker():
+    """Simulated PnL fluctuation on a fixed cadence, independent of how often the dashboard polls"""
+    while True:
+        await asyncio.sleep(PNL_TICK_INTERVAL)
+        # Engine loop is the only writer of daily_pnl, so no lock is needed
+        state.metrics["daily_pnl"] += (time.time() % 10 - 5) * 10
+
 @app.get("/api/v1/dashboard/metrics")
-def get_metrics():
-    # Update pnl simulation based on market
-    with state.lock:
-        # Simulate some PnL fluctuation
-        state.metrics["daily_pnl"] += (time.time() % 10 - 5) * 10 
-        state.metrics["system_health"] = state.system_health
-        state.metrics["execution_mode"] = state.execution_mode
-        
-        return {
-            "metrics": state.metrics,
-            "market_data": state.market_data,
-            "is_running": state.is_running,
-            "data_engine_status": LiveDataManager().status,
-            "timestamp": time.time()
-        }
+async def get_metrics():
+    # Serve the recently built response so multiple polling tabs share one build
+    now = time.time()
+    ts, cached = state._metrics_cache
+    if cached and now - ts < METRICS_CACHE_TTL:
+        return cached
+
+    # Pure read: PnL moves in pnl_ticker, not per request
+    metrics = {
+        **state.metrics,
+        "system_health": state.system_health,
+        "execution_mode": state.execution_mode
+    }
+    result = {
+        "metrics": metrics,
+        "market_data": state.market_data, # Published snapshot is immutable: no copy needed
+        "is_running": state.is_running,
+        "data_engine_status": LiveDataManager().status,
+        "timestamp": now
+    }
+    state._metrics_cache = (now, result)
+    return result
+
+def cached_json(key, request: Request, build):
+    """Serve a read-mostly payload from pre-serialized bytes, answering 304 when the ETag matches"""
+    entry = state._json_cache.get(key)
+    if entry is None:
+        payload = orjson.dumps(build())
+        entry = (payload, f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"')
+        state._json_cache[key] = entry
+    payload, etag = entry
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(payload, media_type="application/json", headers={"ETag": etag})
+
+def invalidate_json(*keys):
+    for key in keys:
+        state._json_cache.pop(key, None)
 
 @app.get("/api/v1/system/health")
-def get_system_health():
-    return {"status": "success", "health": state.system_health}
+async def get_system_health(request: Request):
+    # Keyed by value: health is flipped by the guidance agent, which never touches the cache
+    health = state.system_health
+    return cached_json(("health", health), request, lambda: {"status": "success", "health": health})
 
 @app.get("/api/v1/trades/open")
-def get_trades():
-    return state.trades
+async def get_trades():
+    return list(state.trades)
 
 @app.get("/api/v1/alerts/logs")
-def get_logs():
-    return state.logs
+async def get_logs():
+    return [{"timestamp": iso_second(int(e["timestamp"])), "message": e["message"]} for e in list(state.logs)]
 
 @app.get("/api/v1/risk/rules")
-def get_rules():
-    return state.risk_rules
+async def get_rules(request: Request):
+    return cached_json("rules", request, lambda: state.risk_rules)
+
+# Precompiled COMMODITY response pieces: fixed symbols, fixed keys, defaults for absent live data
+COMMODITIES = ("GOLD", "SILVER", "CRUDEOIL", "NATGASMINI")
+_COMMODITY_MISSING = {"ltp": None, "close": None, "volume": None, "timestamp": 0, "segment": "MCX"}
+_COMMODITY_TEMPLATE = {
+    "instrument": None, "ltp": None, "close": None, "volume": None, "status": None,
+    "bid": 0.0, "ask": 0.0, "open_interest": 0, "expiry": "", "data_source": "CACHE", "live_status": None
+}
+# Every CommodityLiveManager cache entry (INIT / WS / REST) carries these keys
+_live_extras = operator.itemgetter("bid", "ask", "open_interest", "expiry", "source")
 
 @app.get("/api/v1/market/ohlc/{market}")
-def get_market_ohlc(market: str):
-    with state.lock:
-        current_time = time.time()
-        
-        if market == "COMMODITY":
-            commodities = ["GOLD", "SILVER", "CRUDEOIL", "NATGASMINI"]
-            data_list = []
-            cm = state.commodity_manager
-            comm_cache = cm.get_cache()
-
-            for c in commodities:
-                d = state.market_data.get(c, {"ltp": None, "close": None, "volume": None, "timestamp": 0, "segment": "MCX"})
-                
-                # Enrich with commodity live cache if available
-                live = comm_cache.get(c, {})
-                
-                # Check Market Hours
-                if not is_market_open(d.get("segment", "MCX")):
-                    status = "MARKET_CLOSED"
-                else:
-                    status = "LIVE" if (current_time - d.get("timestamp", 0)) < 15 else "STALE"
-
-                entry = {
-                    "instrument": c,
-                    "ltp": live.get("ltp") or d["ltp"],
-                    "close": live.get("close") or d["close"],
-                    "volume": live.get("volume") or d["volume"],
-                    "status": status,
-                    "bid": live.get("bid", 0.0),
-                    "ask": live.get("ask", 0.0),
-                    "open_interest": live.get("open_interest", 0),
-                    "expiry": live.get("expiry", ""),
-                    "data_source": live.get("source", "CACHE"),
-                    "live_status": cm.status
-                }
-                data_list.append(entry)
-
-            return {
-                "status": "success",
-                "data": data_list,
-                "commodity_feed_status": cm.status,
-                "commodity_last_update": cm.last_update
-            }
-        else:
-            d = state.market_data.get(market, {"ltp": None, "close": None, "volume": None, "timestamp": 0, "segment": "NSE"})
+async def get_market_ohlc(market: str):
+    current_time = time.time()
+    minute = minute_of_week() # One clock read per request, shared by every segment check
+    
+    if market == "COMMODITY":
+        data_list = []
+        cm = state.commodity_manager
+        comm_cache = cm.get_cache()
+        live_status = cm.status
+        snapshot = state.market_data # One consistent view across all commodities
+
+        for c in COMMODITIES:
+            d = snapshot.get(c, _COMMODITY_MISSING)
             
-            # Check Market Hours
-            if not is_market_open(d.get("segment", "NSE")):
-                return {
-                    "status": "MARKET_CLOSED",
-                    "instrument": market,
-                    "ltp": d["ltp"],
-                    "close": d["close"],
-                    "reason": "Market is currently closed for this segment."
-                }
-
-            status = "LIVE" if (current_time - d.get("timestamp", 0)) < 15 else "STALE"
+            # Enrich with commodity live cache if available
+            live = comm_cache.get(c)
             
-            if d["ltp"] == 0:
-                return {
-                    "status": "DATA_UNAVAILABLE",
-                    "reason": "Live data temporarily unavailable"
-                }
+            # Check Market Hours
+            if not is_market_open(d.get("segment", "MCX"), minute):
+                status = "MARKET_CLOSED"
+            else:
+                status = "LIVE" if (current_time - d.get("timestamp", 0)) < 15 else "STALE"
+
+            entry = _COMMODITY_TEMPLATE.copy()
+            entry["instrument"] = c
+            entry["status"] = status
+            entry["live_status"] = live_status
+            if live:
+                entry["ltp"] = live["ltp"] or d["ltp"]
+                entry["close"] = live.get("close") or d["close"]
+                entry["volume"] = live["volume"] or d["volume"]
+                entry["bid"], entry["ask"], entry["open_interest"], entry["expiry"], entry["data_source"] = _live_extras(live)
+            else:
+                entry["ltp"] = d["ltp"]
+                entry["close"] = d["close"]
+                entry["volume"] = d["volume"]
+            data_list.append(entry)
 
+        return {
+            "status": "success",
+            "data": data_list,
+            "commodity_feed_status": cm.status,
+            "commodity_last_update": cm.last_update
+        }
+    else:
+        d = state.market_data.get(market, {"ltp": None, "close": None, "volume": None, "timestamp": 0, "segment": "NSE"})
+        
+        # Check Market Hours
+        if not is_market_open(d.get("segment", "NSE"), minute):
             return {
-                "status": "success", 
+                "status": "MARKET_CLOSED",
                 "instrument": market,
-                "ltp": d["ltp"], 
-                "close": d["close"], 
-                "volume": d["volume"],
-                "data_status": status
+                "ltp": d["ltp"],
+                "close": d["close"],
+                "reason": "Market is currently closed for this segment."
             }
 
+        status = "LIVE" if (current_time - d.get("timestamp", 0)) < 15 else "STALE"
+        
+        if d["ltp"] == 0:
+            return {
+                "status": "DATA_UNAVAILABLE",
+                "reason": "Live data temporarily unavailable"
+            }
+
+        return {
+            "status": "success", 
+            "instrument": market,
+            "ltp": d["ltp"], 
+            "close": d["close"], 
+            "volume": d["volume"],
+            "data_status": status
+        }
+
 @app.post("/api/v1/market/monitor")
 async def update_monitored_instruments(request: Request):
     data = await request.json()
@@ -527,7 +724,7 @@ async def update_monitored_instruments(request: Request):
         raise HTTPException(status_code=400, detail="Instruments must be a list")
     
     with state.lock:
-        state.monitored_instruments = set(instruments)
+        state.monitored_instruments = frozenset(instruments)
         state.add_log(f"Monitoring Scope Updated: {list(state.monitored_instruments)}")
     
     # Restart data engine to apply new subscriptions (Alice Blue socket needs re-subscription)
@@ -539,24 +736,23 @@ async def update_monitored_instruments(request: Request):
     return {"status": "success", "monitored": list(state.monitored_instruments)}
 
 @app.get("/market-data/{symbol}")
-def get_live_market_data(symbol: str):
+async def get_live_market_data(symbol: str):
     """Production-spec Live Market Data Endpoint"""
     ldm = LiveDataManager()
     data = ldm.get_market_snapshot(symbol)
     
     if not data:
         # Fallback to general state if not in LDM cache (e.g. simulation/mock modes)
-        with state.lock:
-            cached = state.market_data.get(symbol)
-            if cached:
-                return {
-                    "ltp": cached.get("ltp"),
-                    "bid": cached.get("bid"),
-                    "ask": cached.get("ask"),
-                    "volume": cached.get("volume"),
-                    "timestamp": datetime.datetime.fromtimestamp(cached.get("timestamp", 0)).isoformat() if cached.get("timestamp") else None,
-                    "status": cached.get("status", "DISCONNECTED")
-                }
+        cached = state.market_data.get(symbol)
+        if cached:
+            return {
+                "ltp": cached.get("ltp"),
+                "bid": cached.get("bid"),
+                "ask": cached.get("ask"),
+                "volume": cached.get("volume"),
+                "timestamp": datetime.datetime.fromtimestamp(cached.get("timestamp", 0)).isoformat() if cached.get("timestamp") else None,
+                "status": cached.get("status", "DISCONNECTED")
+            }
         raise HTTPException(status_code=404, detail=f"Market data for {symbol} not found")
 
     return {
@@ -569,7 +765,7 @@ def get_live_market_data(symbol: str):
     }
 
 @app.get("/market-status")
-def get_market_status():
+async def get_market_status():
     """Production-spec Market Status Endpoint"""
     ldm = LiveDataManager()
     cm = state.commodity_manager
@@ -580,7 +776,7 @@ def get_market_status():
     }
 
 @app.get("/api/v1/commodity/live-status")
-def get_commodity_live_status():
+async def get_commodity_live_status():
     """Commodity futures live data connection status & cache."""
     cm = state.commodity_manager
     return {
@@ -594,24 +790,23 @@ def get_commodity_live_status():
     }
 
 @app.get("/api/v1/commodity/snapshot/{symbol}")
-def get_commodity_snapshot(symbol: str):
+async def get_commodity_snapshot(symbol: str):
     """Get live snapshot for a single commodity."""
     cm = state.commodity_manager
     data = cm.get_snapshot(symbol.upper())
     if not data:
         # Fallback to main market_data state
-        with state.lock:
-            cached = state.market_data.get(symbol.upper())
-            if cached:
-                return {
-                    "status": "success",
-                    "instrument": symbol.upper(),
-                    "ltp": cached.get("ltp"),
-                    "volume": cached.get("volume"),
-                    "close": cached.get("close"),
-                    "data_source": "FALLBACK",
-                    "live_status": cm.status
-                }
+        cached = state.market_data.get(symbol.upper())
+        if cached:
+            return {
+                "status": "success",
+                "instrument": symbol.upper(),
+                "ltp": cached.get("ltp"),
+                "volume": cached.get("volume"),
+                "close": cached.get("close"),
+                "data_source": "FALLBACK",
+                "live_status": cm.status
+            }
         raise HTTPException(status_code=404, detail=f"No data for {symbol}")
 
     return {
@@ -621,12 +816,17 @@ def get_commodity_snapshot(symbol: str):
         "live_status": cm.status
     }
 
+@lru_cache(maxsize=512)
+def _cached_search(q: str, limit: int) -> tuple:
+    """Memoized instrument search; the instrument master is static for the session"""
+    return tuple(state.search_mgr.search(q, limit=limit))
+
 @app.get("/api/v1/market/search")
 async def search_symbols(q: str = ""):
     """Universal symbol search across NSE, BSE, MCX"""
     if len(q) < 2:
         return {"status": "success", "results": []}
-    results = state.search_mgr.search(q, limit=10)
+    results = list(_cached_search(q.upper(), 10))
     return {"status": "success", "results": results}
 
 @app.post("/api/v1/market/select")
@@ -643,25 +843,25 @@ async def select_symbol(request: Request):
     with state.lock:
         state.active_symbol = symbol
         state.active_exch = exch
-        state.token_map[str(inst["token"])] = symbol
-        
-        # Initialize with LOADING status instead of 0.0 to trigger UI shimmer
-        if symbol not in state.market_data or state.market_data[symbol].get("ltp") == 0:
-            state.market_data[symbol] = {
-                "ltp": None, "close": None, "volume": None, 
-                "status": "LOADING", "timestamp": time.time()
-            }
+    state.token_map[str(inst["token"])] = symbol
+
+    # Initialize with LOADING status instead of 0.0 to trigger UI shimmer
+    current = state.market_data.get(symbol)
+    if current is None or current.get("ltp") == 0:
+        state.publish_market_data(symbol, {
+            "ltp": None, "close": None, "volume": None, 
+            "status": "LOADING", "timestamp": time.time()
+        }, replace=True)
     
     # Support for immediate REST snapshot to avoid 0 LTP glitch
     if state.execution_mode in ["PAPER", "REAL"]:
         ldm = LiveDataManager()
         
         # Initialize as LOADING
-        with state.lock:
-            state.market_data[symbol] = {
-                "ltp": None, "close": None, "volume": None, 
-                "status": "LOADING", "timestamp": time.time()
-            }
+        state.publish_market_data(symbol, {
+            "ltp": None, "close": None, "volume": None, 
+            "status": "LOADING", "timestamp": time.time()
+        }, replace=True)
         
         # Background fetch
         asyncio.create_task(ldm.subscribe_symbol({
@@ -674,11 +874,10 @@ async def select_symbol(request: Request):
         state.add_log(f"Atomic subscription for {symbol} initiated.")
     else:
         # VIRTUAL/MOCK mode
-        with state.lock:
-            state.market_data[symbol] = {
-                "ltp": 150.0, "close": 150.0, "volume": 1000, 
-                "status": "VIRTUAL", "timestamp": time.time()
-            }
+        state.publish_market_data(symbol, {
+            "ltp": 150.0, "close": 150.0, "volume": 1000, 
+            "status": "VIRTUAL", "timestamp": time.time()
+        }, replace=True)
         state.add_log(f"Selected virtual symbol: {symbol}")
         
     return {
@@ -689,7 +888,7 @@ async def select_symbol(request: Request):
     }
 
 @app.get("/api/v1/market/data/{symbol}")
-def get_symbol_data(symbol: str):
+async def get_symbol_data(symbol: str):
     """Fetch latest snapshot for specific symbol"""
     symbol = symbol.upper()
     data = state.market_data.get(symbol)
@@ -721,23 +920,23 @@ def get_symbol_data(symbol: str):
     }
 
 @app.get("/api/v1/account/balance")
-def get_balance():
+async def get_balance(request: Request):
     # Return simulated balance based on total_capital
-    return {"status": "success", "balance": state.metrics["total_capital"]}
+    return cached_json("balance", request, lambda: {"status": "success", "balance": state.metrics["total_capital"]})
 
 @app.get("/api/v1/agents/status")
-def get_agent_status():
+async def get_agent_status():
     return state.agent_manager.get_agent_statuses()
 
 @app.get("/api/v1/agents/audit")
-def get_audit_trail():
+async def get_audit_trail():
     return state.agent_manager.get_audit_trail()
 
 @app.post("/api/v1/agents/guidance/on-demand")
 async def get_on_demand_guidance():
     # Collect some context for the prompt
     recent_events = state.agent_manager.get_audit_trail(15)
-    context_str = json.dumps(recent_events)
+    context_str = orjson.dumps(recent_events).decode()
     advice = state.guide_agent.get_on_demand_advice(context_str)
     return {"status": "success", "advice": advice}
 
@@ -747,6 +946,7 @@ async def update_risk(request: Request):
     with state.lock:
         state.risk_rules.update(data)
         state.metrics["total_capital"] = data.get("total_capital", state.metrics["total_capital"])
+    invalidate_json("rules", "balance") # total_capital may have changed too
     state.add_log("Risk Protocols Updated via API")
     return {"status": "success"}
 
@@ -755,12 +955,14 @@ async def update_capital(request: Request):
     data = await request.json()
     with state.lock:
         state.metrics["total_capital"] = data.get("amount", state.metrics["total_capital"])
+    invalidate_json("balance")
     state.add_log(f"Capital Allocation Updated: Rs.{state.metrics['total_capital']}")
     return {"status": "success"}
 
 @app.post("/api/v1/system/start")
-def system_start():
+async def system_start():
     state.is_running = True
+    state._metrics_cache = (0.0, None)
     state.add_log(">>> ALGO SYSTEM STARTED: LIVE MONITORING <<<")
     return {"status": "success"}
 
@@ -788,27 +990,29 @@ async def set_execution_mode(request: Request):
     
     # Safety Check 1: Validate credentials for REAL mode
     if new_mode == "REAL":
-        if not API_KEY or not USER_ID or not TOTP_SECRET:
+        if not CREDS_OK:
             raise HTTPException(
                 status_code=403, 
                 detail="REAL mode requires valid broker API credentials. Please configure API_KEY, USER_ID, and TOTP_SECRET in .env file."
             )
     
+    # Audit Log formatting with User ID (outside the lock)
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    log_ts = time.time()
+    user_info = _USER_LOG_PREFIX
+
     # Safety Check 2: Check for active mid-execution orders (if applicable)
     with state.lock:
         old_mode = state.execution_mode
-        
-        # Audit Log formatting with User ID
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        user_info = f"USER:{USER_ID}" if USER_ID else "USER:SYSTEM"
-        state.add_log(f"[{timestamp}] {user_info} MODE SWITCH: {old_mode} -> {new_mode}")
+        state.logs.append({"timestamp": log_ts, "message": f"[{timestamp}] {user_info} MODE SWITCH: {old_mode} -> {new_mode}"})
         
         # Perform the switch
         state.execution_mode = new_mode
+        state._metrics_cache = (0.0, None)
         
         # Isolation: Clear trades when switching modes to prevent data contamination
-        state.trades = []
-        state.add_log(f"[{timestamp}] {user_info} ISOLATION: Positions cleared for {new_mode} mode")
+        state.trades.clear()
+        state.logs.append({"timestamp": log_ts, "message": f"[{timestamp}] {user_info} ISOLATION: Positions cleared for {new_mode} mode"})
     
     # Initialize data source based on rules:
     # MOCK: No live data required
@@ -816,23 +1020,13 @@ async def set_execution_mode(request: Request):
     # PAPER/REAL: Enable live market data feed
     if new_mode in ["PAPER", "REAL"]:
         try:
-            # Bridging thread to async LDM (includes commodity data engine)
-            def run_async_start():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(start_data_engine())
-            
-            threading.Thread(target=run_async_start, daemon=True).start()
+            # Runs on the server loop itself (includes commodity data engine)
+            await replace_engine_task(start_data_engine())
         except Exception as e:
             state.add_log(f"Live data initialization failed: {str(e)}")
     else:
         # Non-live modes: Ensure live engine + commodity engine are stopped
-        def run_async_stop():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(stop_data_engine())
-        
-        threading.Thread(target=run_async_stop, daemon=True).start()
+        await replace_engine_task(stop_data_engine())
         if new_mode == "SIMULATION":
             # Logic for starting internal/historical simulator could go here
             state.add_log("Internal simulation feed initialized.")
@@ -841,15 +1035,7 @@ async def set_execution_mode(request: Request):
             state.add_log("Internal mock data engine active.")
     
     # Determine data connection status message
-    data_status = "disabled"
-    if new_mode == "MOCK":
-        data_status = "Internal Mock Data (Isolated)"
-    elif new_mode == "SIMULATION":
-        data_status = "Simulated Feed Active"
-    elif new_mode == "PAPER":
-        data_status = "Live Data Enabled (Virtual Execution)"
-    elif new_mode == "REAL":
-        data_status = "Live Data + Live Execution ACTIVE"
+    data_status = DATA_STATUS_MSG.get(new_mode, "disabled")
     
     return {
         "status": "success", 
@@ -861,18 +1047,18 @@ async def set_execution_mode(request: Request):
     }
 
 @app.post("/api/v1/system/square_off_all")
-def square_off():
+async def square_off():
     state.add_log("[EMERGENCY] SQUARE OFF INITIATED [EMERGENCY]")
     with state.lock:
-        state.trades = []
+        state.trades.clear()
         state.metrics["used_capital_amount"] = 0
     return {"status": "success"}
 
 # --- ADMIN USER MANAGEMENT ---
 
 @app.get("/api/v1/admin/users/list")
-def list_managed_users():
-    return {"status": "success", "users": state.managed_users}
+async def list_managed_users(request: Request):
+    return cached_json("users", request, lambda: {"status": "success", "users": state.managed_users})
 
 @app.post("/api/v1/admin/users/add")
 async def add_managed_user(request: Request):
@@ -889,20 +1075,22 @@ async def add_managed_user(request: Request):
     # handshake/validation via the broker API.
     # For this system (MOCK MODE), we simulate a successful validation.
     
+    # Add to managed list (READ-ONLY ACCESS SCOPED)
+    new_user = {
+        "user_id": user_id,
+        "role": "MANAGED_TRADER",
+        "status": "CONNECTED",
+        "sync": "READ_ONLY",
+        "joined_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
     with state.lock:
         # Check for duplicates
-        if any(u["user_id"] == user_id for u in state.managed_users):
+        if user_id in state.managed_users_by_id:
             raise HTTPException(status_code=400, detail="User already onboarded")
-        
-        # Add to managed list (READ-ONLY ACCESS SCOPED)
-        new_user = {
-            "user_id": user_id,
-            "role": "MANAGED_TRADER",
-            "status": "CONNECTED",
-            "sync": "READ_ONLY",
-            "joined_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        state.managed_users_by_id[user_id] = new_user
         state.managed_users.append(new_user)
+    invalidate_json("users")
         
     state.add_log(f"Secure Onboarding Successful: User {user_id} added (READ-ONLY)")
     
@@ -910,15 +1098,9 @@ async def add_managed_user(request: Request):
     return {"status": "success", "user": user_id}
 
 if __name__ == "__main__":
-    # Note: Initial start could be async if we want
-    def initial_start():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        # Start worker as part of the loop
-        state._worker_task = loop.create_task(agent_worker())
-        loop.run_until_complete(start_data_engine())
-        
-    threading.Thread(target=initial_start, daemon=True).start()
-    
+    # Data engine, agent worker and simulated feed start on the server loop (see lifespan).
+    # "auto" picks uvloop + httptools when installed (uvicorn[standard]; uvloop has no Windows build).
+    # Single worker on purpose: GlobalExchangeState, the broker session and the tick feed live in-process,
+    # so extra workers would each log in to the broker and serve diverging mode/trades/market data.
     print(" Anti-Gravity Web Server starting at http://0.0.0.0:8001")
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(app, host="0.0.0.0", port=8001, loop="auto", http="auto", workers=1)
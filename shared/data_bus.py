@@ -3,7 +3,9 @@ import threading
 class DataBus:
     """
     Shared data bus for live market data across agents.
-    Thread-safe implementation.
+    Copy-on-write: writers swap in a new dict under a writer-only lock, so
+    readers (including get_all_data) never lock and never copy. Callers must
+    treat returned dicts as read-only.
     """
     _instance = None
     _lock = threading.Lock()
@@ -13,32 +15,33 @@ class DataBus:
             if cls._instance is None:
                 cls._instance = super(DataBus, cls).__new__(cls)
                 cls._instance.data = {}
-                cls._instance.lock = threading.Lock()
+                cls._instance._write_lock = threading.Lock()
         return cls._instance
 
     def __setitem__(self, key, value):
-        with self.lock:
-            self.data[key] = value
+        self.update_data(key, value)
 
     def __getitem__(self, key):
-        with self.lock:
-            return self.data.get(key, None)
+        return self.data.get(key, None)
 
     def update_data(self, symbol, data):
-        with self.lock:
-            self.data[symbol] = data
+        with self._write_lock:
+            snapshot = dict(self.data)
+            snapshot[symbol] = data
+            self.data = snapshot
 
     def get_data(self, symbol):
-        with self.lock:
-            return self.data.get(symbol, None)
+        return self.data.get(symbol, None)
 
     def get_all_data(self):
-        with self.lock:
-            return self.data.copy()
+        # Published snapshots are never mutated: safe to hand out as-is
+        return self.data
 
     def delete_data(self, symbol):
-        with self.lock:
-            if symbol in self.data:
-                del self.data[symbol]
-                return True
-            return False
+        with self._write_lock:
+            if symbol not in self.data:
+                return False
+            snapshot = dict(self.data)
+            del snapshot[symbol]
+            self.data = snapshot
+            return True